@@ -1,10 +1,17 @@
 # app.py
 from flask import Flask, request, jsonify
+from flask.cli import AppGroup
 from flasgger import Swagger, swag_from
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
+from sqlalchemy import func, inspect
+from sqlalchemy.exc import IntegrityError
 from dotenv import load_dotenv
+from read_model import (
+    CatalogReadModel, SORT_FIELDS as READ_MODEL_SORT_FIELDS, CATALOG_VERSION_ID,
+    bump_version_statement, prune_statements,
+)
+from sharding import ShardRouter
 import os
 
 load_dotenv()
@@ -13,6 +20,18 @@ app = Flask(__name__)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'default_secret_key')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///medical_services.db')
+# In-memory read model для GET /api/services и /api/services/stats (см. read_model.py)
+app.config['READ_MODEL_ENABLED'] = os.environ.get('READ_MODEL_ENABLED', '0') == '1'
+# Как часто (в секундах) сверять версию каталога с БД; 0 - на каждом запросе.
+# Догрузка после записи копирует колонки и правит перестановки (~7 мс на 100k строк)
+app.config['READ_MODEL_REFRESH_INTERVAL'] = float(os.environ.get('READ_MODEL_REFRESH_INTERVAL', 0))
+# Шардирование medical_service: URL шардов через запятую (см. sharding.py)
+SHARD_DATABASE_URLS = [url.strip() for url in os.environ.get('SHARD_DATABASE_URLS', '').split(',') if url.strip()]
+app.config['SQLALCHEMY_BINDS'] = {f'shard{i}': url for i, url in enumerate(SHARD_DATABASE_URLS)}
+# Ключ шардирования: doctor_specialty или id
+app.config['SHARD_KEY'] = os.environ.get('SHARD_KEY', 'doctor_specialty')
+# Разрешает запуск, пока в основной БД остались несшардированные услуги (для flask shards backfill)
+app.config['SHARD_BACKFILL'] = os.environ.get('SHARD_BACKFILL', '0') == '1'
 
 
 # инициализация SQLAlchemy
@@ -44,9 +63,157 @@ class MedicalService(db.Model):
             'is_available': self.is_available
         }
 
+# Версия каталога для read model: одна строка, повышается каждой записью
+class CatalogVersion(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    pruned_version = db.Column(db.Integer, nullable=False, default=0)
+
+# Журнал изменений каталога: какая услуга изменилась в какой версии
+class ServiceChange(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, index=True)
+    service_id = db.Column(db.Integer, nullable=False)
+
 # Создание таблицы в базе данных
 with app.app_context():
-    db.create_all()
+    shards = None
+    if SHARD_DATABASE_URLS:
+        # При шардировании основная БД не используется: таблицы создаются только в шардах
+        shards = ShardRouter([db.engines[key] for key in app.config['SQLALCHEMY_BINDS']],
+                             MedicalService, key=app.config['SHARD_KEY'])
+
+        # Услуги, оставшиеся в основной БД, при шардировании не видны ни одному запросу
+        if inspect(db.engine).has_table(MedicalService.__tablename__):
+            unsharded = db.session.query(func.count(MedicalService.id)).scalar()
+            if unsharded and not app.config['SHARD_BACKFILL']:
+                raise RuntimeError(
+                    f'В основной БД осталось {unsharded} услуг, которые не видны при шардировании. '
+                    'Перенесите их в шарды: SHARD_BACKFILL=1 flask shards backfill'
+                )
+    else:
+        db.create_all()
+
+        if db.session.get(CatalogVersion, CATALOG_VERSION_ID) is None:
+            try:
+                db.session.add(CatalogVersion(id=CATALOG_VERSION_ID, version=0, pruned_version=0))
+                db.session.commit()
+            except IntegrityError:
+                # Строку уже создал другой воркер
+                db.session.rollback()
+
+if shards is not None:
+    @app.teardown_appcontext
+    def close_shard_sessions(exc):
+        shards.remove()
+
+    shards_cli = AppGroup('shards', help='Обслуживание шардов medical_service')
+
+    @shards_cli.command('backfill')
+    def backfill_shards():
+        """Переносит услуги из основной БД в шарды, сохраняя их ID."""
+        if not inspect(db.engine).has_table(MedicalService.__tablename__):
+            print('В основной БД нет таблицы medical_service, переносить нечего')
+            return
+        moved = shards.backfill(db.session)
+        print(f'Перенесено услуг: {moved}')
+
+    app.cli.add_command(shards_cli)
+
+read_model = None
+if app.config['READ_MODEL_ENABLED']:
+    if shards is not None:
+        raise RuntimeError('READ_MODEL_ENABLED не поддерживается вместе с SHARD_DATABASE_URLS')
+    read_model = CatalogReadModel(db, MedicalService, CatalogVersion, ServiceChange,
+                                  refresh_interval=app.config['READ_MODEL_REFRESH_INTERVAL'])
+
+# Максимальное число ID в ?ids= и операций в одном /api/batch
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 100))
+
+REQUIRED_SERVICE_FIELDS = ['service_name', 'doctor_specialty', 'price',]
+
+
+def parse_ids(raw):
+    """Разбирает строку вида "1,2,3" в список уникальных ID.
+
+    Возвращает (ids, None) или (None, текст ошибки).
+    """
+    parts = raw.split(',')
+    # Длину проверяем до разбора, чтобы не обрабатывать заведомо слишком длинный список
+    if len(parts) > MAX_BATCH_SIZE:
+        return None, f'Слишком много ID: максимум {MAX_BATCH_SIZE}'
+    ids = []
+    seen = set()
+    for part in parts:
+        part = part.strip()
+        # isdigit() пропускает символы вроде '²', на которых падает int()
+        if not (part.isascii() and part.isdecimal()):
+            return None, f'Неверный список ID: {raw}'
+        service_id = int(part)
+        if service_id not in seen:
+            seen.add(service_id)
+            ids.append(service_id)
+    return ids, None
+
+
+def validate_service_data(data, partial=False):
+    """Проверяет поля услуги и возвращает текст ошибки или None."""
+    # Проверка наличия всех необходимых полей
+    if not partial:
+        for field in REQUIRED_SERVICE_FIELDS:
+            if field not in data:
+                return f'Отсутствует обязательное поле: {field}'
+
+    if 'service_name' in data:
+        if not isinstance(data['service_name'], str) or not data['service_name'].strip():
+            return 'Название услуги должно быть непустой строкой'
+
+    if 'doctor_specialty' in data:
+        if not isinstance(data['doctor_specialty'], str) or not data['doctor_specialty'].strip():
+            return 'Специальность врача должна быть непустой строкой'
+
+    # Проверка, что цена - это число и оно положительное
+    if 'price' in data:
+        if not isinstance(data['price'], (int, float)) or data['price'] < 0:
+            return 'Цена должна быть положительным числом'
+
+    if 'is_available' in data and not isinstance(data['is_available'], bool):
+        return 'Поле доступности должно быть логическим значением'
+
+    return None
+
+
+def record_change(service_id):
+    """Повышает версию каталога в текущей транзакции (нужно вызывать при каждой записи)."""
+    # Версия нужна только read model, а он несовместим с шардированием
+    if shards is None:
+        version = db.session.execute(bump_version_statement(CatalogVersion)).scalar_one()
+        db.session.add(ServiceChange(version=version, service_id=service_id))
+        for statement in prune_statements(CatalogVersion, ServiceChange, version):
+            db.session.execute(statement)
+
+
+def service_session(service_id):
+    """Сессия, в которой хранится услуга: db.session или сессия её шарда."""
+    if shards is None:
+        return db.session
+    return shards.session_for_id(service_id)
+
+
+def add_new_service(service):
+    """Добавляет новую услугу, назначает ей ID и возвращает сессию, в которую она попала."""
+    if shards is None:
+        db.session.add(service)
+        db.session.flush()
+        return db.session
+    return shards.add(service)
+
+
+def apply_service_update(service, data):
+    """Копирует переданные поля в услугу."""
+    for field in ('service_name', 'doctor_specialty', 'price', 'is_available'):
+        if field in data:
+            setattr(service, field, data[field])
 
 # Получение всех услуг с возможностью сортировки
 @app.route('/api/services', methods=['GET'])
@@ -61,6 +228,13 @@ with app.app_context():
             'description': 'Поле для сортировки (id, service_name, doctor_specialty, price)',
             'required': False
         },
+        {
+            'name': 'ids',
+            'in': 'query',
+            'type': 'string',
+            'description': 'Список ID через запятую (например, 1,2,3) - вернуть только эти услуги одним запросом',
+            'required': False
+        },
     ],
     'responses': {
         200: {
@@ -92,7 +266,26 @@ def get_services():
     sort_field = getattr(MedicalService, sort_by)
     sort_field = sort_field.asc()
     
-    services = MedicalService.query.order_by(sort_field).all()
+    query = MedicalService.query
+
+    # Выборка нескольких услуг по ID одним IN-запросом
+    ids = None
+    ids_param = request.args.get('ids')
+    if ids_param is not None:
+        ids, error = parse_ids(ids_param)
+        if error:
+            return jsonify({'error': error}), 400
+        query = query.filter(MedicalService.id.in_(ids))
+
+    if shards is not None:
+        if sort_by not in READ_MODEL_SORT_FIELDS:
+            return jsonify({'error': f'Неизвестное поле для сортировки: {sort_by}'}), 400
+        return jsonify(shards.list_services(sort_by, ids))
+
+    if read_model is not None and sort_by in READ_MODEL_SORT_FIELDS:
+        return jsonify(read_model.current().list(sort_by, ids))
+
+    services = query.order_by(sort_field).all()
     return jsonify([service.to_dict() for service in services])
 
 # Получение статистики по числовым полям
@@ -134,17 +327,23 @@ def get_stats():
     field_column = getattr(MedicalService, field)
     
     # Получение статистики
-    stats = db.session.query(
-        func.min(field_column).label('min'),
-        func.max(field_column).label('max'),
-        func.avg(field_column).label('avg')
-    ).first()
+    if shards is not None:
+        stats_min, stats_max, stats_avg = shards.stats(field)
+    elif read_model is not None:
+        stats_min, stats_max, stats_avg = read_model.current().price_stats()
+    else:
+        stats = db.session.query(
+            func.min(field_column).label('min'),
+            func.max(field_column).label('max'),
+            func.avg(field_column).label('avg')
+        ).first()
+        stats_min, stats_max, stats_avg = stats.min, stats.max, stats.avg
     
     return jsonify({
         'field': field,
-        'min': stats.min,
-        'max': stats.max,
-        'avg': round(stats.avg, 2) if stats.avg else None
+        'min': stats_min,
+        'max': stats_max,
+        'avg': round(stats_avg, 2) if stats_avg else None
     })
 
 # Добавление новой услуги
@@ -193,27 +392,10 @@ def get_stats():
 def add_service():
     try:
         data = request.json
-        required_fields = ['service_name', 'doctor_specialty', 'price',]
-
-        # Проверка наличия всех необходимых полей
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'Отсутствует обязательное поле: {field}'}), 400
-
-                # Валидация данных
-        if not isinstance(data['service_name'], str) or not data['service_name'].strip():
-            return jsonify({'error': 'Название услуги должно быть непустой строкой'}), 400
-
-        if not isinstance(data['doctor_specialty'], str) or not data['doctor_specialty'].strip():
-            return jsonify({'error': 'Специальность врача должна быть непустой строкой'}), 400
-
-            # Проверка, что цена - это число и оно положительное
-        if not isinstance(data['price'], (int, float)) or data['price'] < 0:
-            return jsonify({'error': 'Цена должна быть положительным числом'}), 400
-
-        if 'is_available' in data and not isinstance(data['is_available'], bool):
-            return jsonify({'error': 'Поле доступности должно быть логическим значением'}), 400
 
+        error = validate_service_data(data)
+        if error:
+            return jsonify({'error': error}), 400
 
         # Создание новой услуги
         new_service = MedicalService(
@@ -223,8 +405,9 @@ def add_service():
             is_available=data.get('is_available', True)
         )
 
-        db.session.add(new_service)
-        db.session.commit()
+        session = add_new_service(new_service)
+        record_change(new_service.id)
+        session.commit()
 
         return jsonify({
             'message': 'Услуга успешно добавлена',
@@ -265,7 +448,7 @@ def add_service():
     }
 })
 def get_service(service_id):
-    service = MedicalService.query.get(service_id)
+    service = service_session(service_id).get(MedicalService, service_id)
     if not service:
         return jsonify({'error': 'Услуга не найдена'}), 404
     
@@ -329,7 +512,8 @@ def get_service(service_id):
     }
 })
 def update_service(service_id):
-    service = MedicalService.query.get(service_id)
+    session = service_session(service_id)
+    service = session.get(MedicalService, service_id)
     if not service:
         return jsonify({'error': 'Услуга не найдена'}), 404
     
@@ -345,7 +529,8 @@ def update_service(service_id):
     if 'is_available' in data:
         service.is_available = data['is_available']
     
-    db.session.commit()
+    record_change(service_id)
+    session.commit()
     
     return jsonify({
         'message': 'Услуга успешно обновлена',
@@ -422,7 +607,8 @@ def update_service(service_id):
     }
 })
 def patch_service(service_id):
-    service = MedicalService.query.get(service_id)
+    session = service_session(service_id)
+    service = session.get(MedicalService, service_id)
     if not service:
         return jsonify({'error': 'Услуга не найдена'}), 404
     
@@ -431,28 +617,14 @@ def patch_service(service_id):
         return jsonify({'error': 'Отсутствуют данные для обновления'}), 400
     
     # Валидация данных, если они предоставлены
-    if 'service_name' in data:
-        if not isinstance(data['service_name'], str) or not data['service_name'].strip():
-            return jsonify({'error': 'Название услуги должно быть непустой строкой'}), 400
-        service.service_name = data['service_name']
-        
-    if 'doctor_specialty' in data:
-        if not isinstance(data['doctor_specialty'], str) or not data['doctor_specialty'].strip():
-            return jsonify({'error': 'Специальность врача должна быть непустой строкой'}), 400
-        service.doctor_specialty = data['doctor_specialty']
-        
-    if 'price' in data:
-        if not isinstance(data['price'], (int, float)) or data['price'] < 0:
-            return jsonify({'error': 'Цена должна быть положительным числом'}), 400
-        service.price = data['price']
-        
-    if 'is_available' in data:
-        if not isinstance(data['is_available'], bool):
-            return jsonify({'error': 'Поле доступности должно быть логическим значением'}), 400
-        service.is_available = data['is_available']
+    error = validate_service_data(data, partial=True)
+    if error:
+        return jsonify({'error': error}), 400
+    apply_service_update(service, data)
+    record_change(service_id)
     
     # Сохранение изменений
-    db.session.commit()
+    session.commit()
     
     return jsonify({
         'message': 'Услуга успешно обновлена',
@@ -485,15 +657,212 @@ def patch_service(service_id):
     }
 })
 def delete_service(service_id):
-    service = MedicalService.query.get(service_id)
+    session = service_session(service_id)
+    service = session.get(MedicalService, service_id)
     if not service:
         return jsonify({'error': 'Услуга не найдена'}), 404
     
-    db.session.delete(service)
-    db.session.commit()
+    session.delete(service)
+    record_change(service_id)
+    session.commit()
     
     return jsonify({'message': f'Услуга {service_id} успешно удалена'})
 
+def run_batch_operation(op, preloaded):
+    """Выполняет одну операцию пакета в текущей транзакции и возвращает (тело, статус).
+
+    preloaded - {ID: услуга или None} для заранее загруженных ID; держит ссылки
+    на объекты весь пакет и обновляется при создании и удалении.
+    """
+    if not isinstance(op, dict):
+        return {'error': 'Операция должна быть объектом'}, 400
+
+    method = op.get('method')
+    data = op.get('body')
+
+    if method == 'create':
+        if not isinstance(data, dict):
+            return {'error': 'Отсутствуют данные для создания'}, 400
+        error = validate_service_data(data)
+        if error:
+            return {'error': error}, 400
+        new_service = MedicalService(
+            service_name=data['service_name'],
+            doctor_specialty=data['doctor_specialty'],
+            price=data['price'],
+            is_available=data.get('is_available', True)
+        )
+        add_new_service(new_service)
+        record_change(new_service.id)
+        preloaded[new_service.id] = new_service
+        return {'message': 'Услуга успешно добавлена', 'service': new_service.to_dict()}, 201
+
+    if method not in ('get', 'patch', 'delete'):
+        return {'error': f'Неизвестная операция: {method}'}, 400
+
+    service_id = op.get('id')
+    if not isinstance(service_id, int) or isinstance(service_id, bool):
+        return {'error': 'ID услуги должен быть целым числом'}, 400
+
+    session = service_session(service_id)
+    if service_id in preloaded:
+        service = preloaded[service_id]
+    else:
+        service = session.get(MedicalService, service_id)
+    if not service:
+        return {'error': 'Услуга не найдена'}, 404
+
+    if method == 'get':
+        return service.to_dict(), 200
+
+    if method == 'patch':
+        if not data:
+            return {'error': 'Отсутствуют данные для обновления'}, 400
+        if not isinstance(data, dict):
+            return {'error': 'Данные для обновления должны быть объектом'}, 400
+        error = validate_service_data(data, partial=True)
+        if error:
+            return {'error': error}, 400
+        apply_service_update(service, data)
+        record_change(service_id)
+        session.flush()
+        return {'message': 'Услуга успешно обновлена', 'service': service.to_dict()}, 200
+
+    session.delete(service)
+    record_change(service_id)
+    session.flush()
+    preloaded[service_id] = None
+    return {'message': f'Услуга {service_id} успешно удалена'}, 200
+
+# Пакетное выполнение операций в одной транзакции
+@app.route('/api/batch', methods=['POST'])
+@swag_from({
+    'tags': ['Врачебные услуги'],
+    'summary': 'Выполните несколько операций над услугами за один запрос',
+    'description': 'Операции выполняются по порядку в одной транзакции. '
+                   'Если хотя бы одна операция завершилась ошибкой, все изменения откатываются. '
+                   'При шардировании (SHARD_DATABASE_URLS) пакет может изменять услуги только '
+                   'одного шарда: шарды не фиксируются атомарно, поэтому пакет, изменяющий '
+                   'несколько шардов, откатывается и отклоняется с кодом 400.',
+    'parameters': [
+        {
+            'name': 'body',
+            'in': 'body',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'operations': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'method': {'type': 'string', 'enum': ['get', 'create', 'patch', 'delete']},
+                                'id': {'type': 'integer'},
+                                'body': {'type': 'object'}
+                            },
+                            'required': ['method']
+                        }
+                    }
+                },
+                'required': ['operations']
+            }
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Результаты операций в порядке запроса',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'committed': {'type': 'boolean'},
+                    'results': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'status': {'type': 'integer'},
+                                'body': {'type': 'object'}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        400: {
+            'description': 'Неверный формат запроса или пакет изменяет несколько шардов',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'error': {'type': 'string'}
+                }
+            }
+        }
+    }
+})
+def batch_services():
+    data = request.get_json(silent=True)
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'Ожидается непустой список operations'}), 400
+    if len(operations) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'Слишком много операций: максимум {MAX_BATCH_SIZE}'}), 400
+
+    try:
+        # Загружаем все затронутые услуги одним IN-запросом и держим их в preloaded
+        # до конца пакета: identity map хранит только слабые ссылки
+        ids = {op.get('id') for op in operations
+               if isinstance(op, dict) and isinstance(op.get('id'), int)
+               and not isinstance(op.get('id'), bool)}
+        preloaded = dict.fromkeys(ids)
+        if ids and shards is None:
+            for service in MedicalService.query.filter(MedicalService.id.in_(ids)):
+                preloaded[service.id] = service
+        elif ids:
+            for shard, shard_ids in shards.group_ids(ids).items():
+                query = shards.session(shard).query(MedicalService).filter(MedicalService.id.in_(shard_ids))
+                for service in query:
+                    preloaded[service.id] = service
+
+        results = []
+        committed = True
+        written_shards = set()
+        for op in operations:
+            body, status = run_batch_operation(op, preloaded)
+            results.append({'status': status, 'body': body})
+            if status >= 400:
+                committed = False
+                break
+            if shards is not None and op['method'] != 'get':
+                service_id = body['service']['id'] if op['method'] == 'create' else op['id']
+                written_shards.add(shards.shard_for_id(service_id))
+
+        # Шарды фиксируются по очереди, и сбой между ними оставил бы пакет
+        # применённым частично, поэтому изменения в нескольких шардах не принимаем
+        if committed and len(written_shards) > 1:
+            db.session.rollback()
+            shards.rollback()
+            return jsonify({'error': 'Пакет изменяет услуги в нескольких шардах '
+                                     f'({", ".join(map(str, sorted(written_shards)))}); '
+                                     'такие изменения нужно отправлять отдельными пакетами'}), 400
+
+        if committed:
+            db.session.commit()
+            if shards is not None:
+                shards.commit()
+        else:
+            db.session.rollback()
+            if shards is not None:
+                shards.rollback()
+
+        return jsonify({'committed': committed, 'results': results})
+
+    except Exception as e:
+        db.session.rollback()
+        if shards is not None:
+            shards.rollback()
+        app.logger.error(f"Error running batch: {str(e)}")
+        return jsonify({'error': 'An internal error occurred'}), 500
+
 # Добавление тестовых данных для примера
 # @app.route('/api/populate', methods=['POST'])
 # @swag_from({
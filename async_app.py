@@ -0,0 +1,209 @@
+# async_app.py
+# Асинхронный режим: те же /api/services* на Quart + AsyncEngine/AsyncSession.
+# Пока view ждёт БД, воркер обслуживает другие запросы, а не держит поток.
+#
+# Запуск под ASGI-воркером:
+#   gunicorn -k uvicorn.workers.UvicornWorker async_app:app
+# Синхронный режим (gunicorn app:app) остаётся без изменений.
+from quart import Quart, request, jsonify
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import os
+
+from app import (
+    app as flask_app, db, shards, MedicalService, CatalogVersion, ServiceChange,
+    parse_ids, validate_service_data, apply_service_update,
+)
+from read_model import bump_version_statement, prune_statements
+
+if shards is not None:
+    raise RuntimeError('Асинхронный режим не поддерживает SHARD_DATABASE_URLS')
+
+# Асинхронные драйверы для схем из DATABASE_URL
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'postgres': 'postgresql+asyncpg',
+}
+
+
+def get_async_database_url():
+    """ASYNC_DATABASE_URL или URL синхронного приложения с асинхронным драйвером."""
+    if os.environ.get('ASYNC_DATABASE_URL'):
+        return os.environ['ASYNC_DATABASE_URL']
+    # URL берём у Flask-SQLAlchemy: там путь к SQLite уже разрешён относительно instance/
+    with flask_app.app_context():
+        url = db.engine.url
+    backend = url.drivername.split('+')[0]
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f'Нет асинхронного драйвера для {url.drivername}, задайте ASYNC_DATABASE_URL')
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+app = Quart(__name__)
+
+engine = create_async_engine(get_async_database_url())
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def record_change(session, service_id):
+    """Повышает версию каталога, как record_change() в app.py."""
+    version = (await session.execute(bump_version_statement(CatalogVersion))).scalar_one()
+    session.add(ServiceChange(version=version, service_id=service_id))
+    for statement in prune_statements(CatalogVersion, ServiceChange, version):
+        await session.execute(statement)
+
+
+# Получение всех услуг с возможностью сортировки
+@app.route('/api/services', methods=['GET'])
+async def get_services():
+    sort_by = request.args.get('sort_by', 'id')
+
+    # Проверка допустимости поля для сортировки
+    if not hasattr(MedicalService, sort_by):
+        return jsonify({'error': f'Неизвестное поле для сортировки: {sort_by}'}), 400
+
+    query = select(MedicalService).order_by(getattr(MedicalService, sort_by).asc())
+
+    # Выборка нескольких услуг по ID одним IN-запросом
+    ids_param = request.args.get('ids')
+    if ids_param is not None:
+        ids, error = parse_ids(ids_param)
+        if error:
+            return jsonify({'error': error}), 400
+        query = query.where(MedicalService.id.in_(ids))
+
+    async with Session() as session:
+        services = (await session.scalars(query)).all()
+    return jsonify([service.to_dict() for service in services])
+
+# Получение статистики по числовым полям
+@app.route('/api/services/stats', methods=['GET'])
+async def get_stats():
+    field = request.args.get('field')
+
+    # Проверка допустимости поля
+    if field not in ['price', ]:
+        return jsonify({'error': f'Неизвестное поле: {field}. Должно быть числовое.'}), 400
+
+    field_column = getattr(MedicalService, field)
+
+    async with Session() as session:
+        stats = (await session.execute(select(
+            func.min(field_column).label('min'),
+            func.max(field_column).label('max'),
+            func.avg(field_column).label('avg')
+        ))).first()
+
+    return jsonify({
+        'field': field,
+        'min': stats.min,
+        'max': stats.max,
+        'avg': round(stats.avg, 2) if stats.avg else None
+    })
+
+# Добавление новой услуги
+@app.route('/api/services', methods=['POST'])
+async def add_service():
+    try:
+        data = await request.get_json()
+
+        error = validate_service_data(data)
+        if error:
+            return jsonify({'error': error}), 400
+
+        async with Session() as session:
+            new_service = MedicalService(
+                service_name=data['service_name'],
+                doctor_specialty=data['doctor_specialty'],
+                price=data['price'],
+                is_available=data.get('is_available', True)
+            )
+            session.add(new_service)
+            await session.flush()
+            await record_change(session, new_service.id)
+            await session.commit()
+
+        return jsonify({
+            'message': 'Услуга успешно добавлена',
+            'service': new_service.to_dict()
+        }), 201
+
+    except Exception as e:
+        app.logger.error(f"Error adding service: {str(e)}")
+        return jsonify({'error': 'An internal error occurred'}), 500
+
+# Получение услуги по ID
+@app.route('/api/services/<int:service_id>', methods=['GET'])
+async def get_service(service_id):
+    async with Session() as session:
+        service = await session.get(MedicalService, service_id)
+    if not service:
+        return jsonify({'error': 'Услуга не найдена'}), 404
+
+    return jsonify(service.to_dict())
+
+# Обновление услуги по ID
+@app.route('/api/services/<int:service_id>', methods=['PUT'])
+async def update_service(service_id):
+    async with Session() as session:
+        service = await session.get(MedicalService, service_id)
+        if not service:
+            return jsonify({'error': 'Услуга не найдена'}), 404
+
+        data = await request.get_json()
+
+        # Обновление полей услуги
+        apply_service_update(service, data)
+        await record_change(session, service_id)
+        await session.commit()
+
+    return jsonify({
+        'message': 'Услуга успешно обновлена',
+        'service': service.to_dict()
+    })
+
+# Partial update of a service by ID
+@app.route('/api/services/<int:service_id>', methods=['PATCH'])
+async def patch_service(service_id):
+    async with Session() as session:
+        service = await session.get(MedicalService, service_id)
+        if not service:
+            return jsonify({'error': 'Услуга не найдена'}), 404
+
+        data = await request.get_json()
+        if not data:
+            return jsonify({'error': 'Отсутствуют данные для обновления'}), 400
+
+        # Валидация данных, если они предоставлены
+        error = validate_service_data(data, partial=True)
+        if error:
+            return jsonify({'error': error}), 400
+        apply_service_update(service, data)
+        await record_change(session, service_id)
+
+        # Сохранение изменений
+        await session.commit()
+
+    return jsonify({
+        'message': 'Услуга успешно обновлена',
+        'service': service.to_dict()
+    })
+
+# Удаление услуги по ID
+@app.route('/api/services/<int:service_id>', methods=['DELETE'])
+async def delete_service(service_id):
+    async with Session() as session:
+        service = await session.get(MedicalService, service_id)
+        if not service:
+            return jsonify({'error': 'Услуга не найдена'}), 404
+
+        await session.delete(service)
+        await record_change(session, service_id)
+        await session.commit()
+
+    return jsonify({'message': f'Услуга {service_id} успешно удалена'})
+
+if __name__ == '__main__':
+    port = int(os.environ.get('PORT', 5000))
+    app.run(port=port)
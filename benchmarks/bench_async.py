@@ -0,0 +1,138 @@
+# benchmarks/bench_async.py
+# Сравнение синхронного (gunicorn app:app) и асинхронного
+# (gunicorn -k uvicorn.workers.UvicornWorker async_app:app) режимов
+# на локальной SQLite-базе при разном числе одновременных соединений.
+#
+#   python benchmarks/bench_async.py [--workers 2] [--duration 10]
+#                                    [--concurrency 10 50 100 250 500]
+#
+# Каждое соединение в цикле запрашивает GET /api/services/<случайный id>.
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = {
+    'sync': ['app:app'],
+    'async': ['-k', 'uvicorn.workers.UvicornWorker', 'async_app:app'],
+}
+
+
+def seed_database(rows):
+    import app as app_module
+
+    with app_module.app.app_context():
+        app_module.db.session.execute(app_module.MedicalService.__table__.insert(), [
+            {
+                'service_name': f'Услуга {i}',
+                'doctor_specialty': 'Терапевт',
+                'price': float(100 + i % 9000),
+                'is_available': True
+            }
+            for i in range(rows)
+        ])
+        app_module.db.session.commit()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, port, workers):
+    command = [sys.executable, '-m', 'gunicorn', '-w', str(workers),
+               '-b', f'127.0.0.1:{port}', '--backlog', '2048', '--log-level', 'warning']
+    process = subprocess.Popen(command + MODES[mode], cwd=ROOT)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'Сервер {mode} не запустился')
+
+
+async def fetch(port, path):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+async def load(port, concurrency, duration, rows):
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async def client():
+        nonlocal errors
+        rng = random.Random()
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                status = await fetch(port, f'/api/services/{rng.randint(1, rows)}')
+            except (OSError, IndexError, ValueError):
+                status = None
+            if status == 200:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                errors += 1
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50, 100, 250, 500])
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    seed_database(args.rows)
+
+    print(f'{"mode":<8}{"conns":>7}{"req/s":>10}{"p50, ms":>10}{"p99, ms":>10}{"errors":>8}')
+    for mode in MODES:
+        port = free_port()
+        process = start_server(mode, port, args.workers)
+        try:
+            # Прогрев: подключения к БД и импорт в каждом воркере
+            asyncio.run(load(port, args.workers * 4, 1, args.rows))
+            for concurrency in args.concurrency:
+                latencies, errors = asyncio.run(load(port, concurrency, args.duration, args.rows))
+                print(f'{mode:<8}{concurrency:>7}{len(latencies) / args.duration:>10.0f}'
+                      f'{statistics.median(latencies) if latencies else float("nan"):>10.1f}'
+                      f'{percentile(latencies, 0.99):>10.1f}{errors:>8}')
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/bench_read_model.py
+# Сравнение SQL-пути и in-memory read model на локальной SQLite-базе.
+#
+#   python benchmarks/bench_read_model.py [--rows 100000] [--repeat 5]
+#
+# Печатает объём памяти снимка и задержку list/sort/stats для обоих путей.
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['READ_MODEL_ENABLED'] = '1'
+
+    import app as app_module
+    from app import app, db, MedicalService
+
+    specialties = ['Терапевт', 'Кардиолог', 'Диагностика', 'Лаборатория', 'Невролог']
+    rng = random.Random(42)
+    with app.app_context():
+        db.session.execute(MedicalService.__table__.insert(), [
+            {
+                'service_name': f'Услуга {i}',
+                'doctor_specialty': rng.choice(specialties),
+                'price': round(rng.uniform(100, 10000), 2),
+                'is_available': rng.random() > 0.1
+            }
+            for i in range(args.rows)
+        ])
+        db.session.commit()
+
+        read_model = app_module.read_model
+        start = time.perf_counter()
+        snapshot = read_model.current()
+        load_ms = (time.perf_counter() - start) * 1000
+        for field in ('id', 'service_name', 'price'):
+            snapshot.order(field)
+
+        print(f'rows: {args.rows}')
+        print(f'snapshot load: {load_ms:.1f} ms')
+        print(f'snapshot memory: {snapshot.nbytes() / 2**20:.1f} MiB '
+              f'({snapshot.nbytes() * 100_000 / max(args.rows, 1) / 2**20:.1f} MiB per 100k rows)')
+
+    client = app.test_client()
+
+    # Обновление снимка после одной записи: догрузка строки и правка перестановок
+    refresh_samples = []
+    for i in range(args.repeat):
+        client.patch(f'/api/services/{i + 1}', json={'price': float(i)})
+        with app.app_context():
+            start = time.perf_counter()
+            read_model.current().order('price')
+            refresh_samples.append((time.perf_counter() - start) * 1000)
+    print(f'refresh after one write: {statistics.median(refresh_samples):.1f} ms')
+
+    cases = [
+        ('list sort_by=id', '/api/services'),
+        ('list sort_by=price', '/api/services?sort_by=price'),
+        ('list sort_by=service_name', '/api/services?sort_by=service_name'),
+        ('list ids (50)', '/api/services?ids=' + ','.join(str(i) for i in range(1, args.rows, max(args.rows // 50, 1)))),
+        ('stats price', '/api/services/stats?field=price'),
+    ]
+
+    print(f'\n{"case":<28}{"sql, ms":>12}{"memory, ms":>14}')
+    for name, url in cases:
+        app_module.read_model = None
+        sql_ms = timed(lambda: client.get(url), args.repeat)
+        app_module.read_model = read_model
+        memory_ms = timed(lambda: client.get(url), args.repeat)
+        print(f'{name:<28}{sql_ms:>12.1f}{memory_ms:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
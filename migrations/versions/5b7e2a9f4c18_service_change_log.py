@@ -0,0 +1,64 @@
+"""catalog version and service change log
+
+Revision ID: 5b7e2a9f4c18
+Revises: d1c3b6b09cc4
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e2a9f4c18'
+down_revision = 'd1c3b6b09cc4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # app.py вызывает db.create_all() при импорте (в том числе из flask db upgrade),
+    # поэтому таблицы, колонки и индексы могут уже существовать
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('catalog_version'):
+        op.create_table('catalog_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('pruned_version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+    else:
+        columns = {column['name'] for column in inspector.get_columns('catalog_version')}
+        with op.batch_alter_table('catalog_version', schema=None) as batch_op:
+            if 'version' not in columns:
+                batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+            if 'pruned_version' not in columns:
+                batch_op.add_column(sa.Column('pruned_version', sa.Integer(), nullable=False, server_default='0'))
+
+    if not inspector.has_table('service_change'):
+        op.create_table('service_change',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('service_id', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+    else:
+        columns = {column['name'] for column in inspector.get_columns('service_change')}
+        if 'version' not in columns:
+            with op.batch_alter_table('service_change', schema=None) as batch_op:
+                batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+
+    indexes = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('service_change')}
+    if 'ix_service_change_version' not in indexes:
+        with op.batch_alter_table('service_change', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_service_change_version'), ['version'], unique=False)
+
+    # Строка версии каталога (её же создаёт app.py при старте)
+    op.execute('INSERT INTO catalog_version (id, version, pruned_version) '
+               'SELECT 1, 0, 0 WHERE NOT EXISTS (SELECT 1 FROM catalog_version WHERE id = 1)')
+
+
+def downgrade():
+    op.drop_table('service_change')
+    op.drop_table('catalog_version')
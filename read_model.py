@@ -0,0 +1,331 @@
+# read_model.py
+# Колоночная in-memory модель каталога для чтения (по одной на воркер).
+# Таблица medical_service загружается в компактные массивы один раз, дальше
+# GET /api/services и /api/services/stats отвечают из памяти, а модель
+# догружает только изменённые строки по журналу service_change.
+#
+# Версия каталога - единственная строка catalog_version. Каждая запись
+# повышает её через UPDATE ... SET version = version + 1 и пишет новую версию
+# в service_change. Блокировка строки выстраивает пишущие транзакции в
+# очередь, поэтому версии фиксируются строго по порядку и читатель, увидевший
+# версию V, уже видит все изменения с версиями <= V.
+#
+# Журнал не растёт бесконечно: раз в CHANGE_LOG_PRUNE_EVERY версий записи
+# старше CHANGE_LOG_RETENTION версий удаляются, а граница сохраняется в
+# catalog_version.pruned_version. Версии воркеров в БД не хранятся: воркер,
+# чей снимок старше этой границы, просто перечитывает таблицу целиком.
+import bisect
+import sys
+import threading
+import time
+from array import array
+
+from sqlalchemy import delete, select, update
+
+# Поля, по которым read model умеет сортировать
+SORT_FIELDS = ('id', 'service_name', 'doctor_specialty', 'price', 'is_available')
+
+# Значения is_available в байтовом массиве (NULL хранится отдельно)
+_AVAILABILITY_CODES = {False: 0, True: 1, None: 2}
+_AVAILABILITY_VALUES = (False, True, None)
+
+# Сколько ID подставлять в один IN-запрос при догрузке
+_IN_CHUNK_SIZE = 500
+
+# До скольких изменённых строк перестановки правятся бинарным поиском;
+# при большем числе они сбрасываются и пересортировываются при следующем чтении
+_MAX_ORDER_PATCHES = 1000
+
+# Сколько последних версий хранить в service_change и как часто чистить журнал
+CHANGE_LOG_RETENTION = 10000
+CHANGE_LOG_PRUNE_EVERY = 1000
+
+# ID единственной строки catalog_version
+CATALOG_VERSION_ID = 1
+
+
+def bump_version_statement(version_model):
+    """UPDATE, повышающий версию каталога и возвращающий новое значение."""
+    return (update(version_model)
+            .where(version_model.id == CATALOG_VERSION_ID)
+            .values(version=version_model.version + 1)
+            .returning(version_model.version))
+
+
+def prune_statements(version_model, change_model, version):
+    """Запросы очистки журнала для версии version (пустой список, если чистить рано)."""
+    if version % CHANGE_LOG_PRUNE_EVERY or version <= CHANGE_LOG_RETENTION:
+        return []
+    horizon = version - CHANGE_LOG_RETENTION
+    return [
+        delete(change_model).where(change_model.version <= horizon),
+        update(version_model).where(version_model.id == CATALOG_VERSION_ID)
+                             .values(pruned_version=horizon),
+    ]
+
+
+class CatalogSnapshot:
+    """Снимок каталога в колоночном виде.
+
+    Колонки после публикации снимка не меняются. Исключение - кэши _orders и
+    _stats: они заполняются лениво из потоков запросов (запись в dict и
+    присваивание атомарны под GIL, в худшем случае перестановка посчитается
+    дважды), поэтому _orders перебирается только по копии.
+
+    Удалённые строки остаются в колонках как «надгробия» (deleted) и только
+    исключаются из positions и перестановок; при их накоплении CatalogReadModel
+    перечитывает таблицу целиком.
+    """
+
+    __slots__ = ('version', 'ids', 'names', 'specialty_codes', 'specialties', 'specialty_index',
+                 'prices', 'available', 'positions', 'deleted', '_orders', '_stats')
+
+    def __init__(self, version, ids, names, specialty_codes, specialties, prices, available,
+                 positions=None, deleted=None):
+        self.version = version
+        self.ids = ids                           # array('q')
+        self.names = names                       # list интернированных строк
+        self.specialty_codes = specialty_codes   # array('I') - индексы в specialties
+        self.specialties = specialties           # list уникальных специальностей
+        self.specialty_index = {specialty: code for code, specialty in enumerate(specialties)}
+        self.prices = prices                     # array('d')
+        self.available = available              # bytearray, см. _AVAILABILITY_CODES
+        if positions is None:
+            positions = {service_id: i for i, service_id in enumerate(ids)}
+        self.positions = positions               # ID -> индекс живой строки
+        self.deleted = deleted or set()          # индексы удалённых строк
+        self._orders = {}
+        self._stats = None
+
+    @classmethod
+    def from_rows(cls, version, rows):
+        """Строит снимок из кортежей (id, service_name, doctor_specialty, price, is_available)."""
+        snapshot = cls(version, array('q'), [], array('I'), [], array('d'), bytearray(), positions={})
+        for row in rows:
+            snapshot._append_row(row)
+        return snapshot
+
+    def _append_row(self, row):
+        service_id, name, specialty, price, is_available = row
+        self.positions[service_id] = len(self.ids)
+        self.ids.append(service_id)
+        self.names.append(sys.intern(name))
+        self.specialty_codes.append(self._specialty_code(specialty))
+        self.prices.append(price)
+        self.available.append(_AVAILABILITY_CODES[is_available])
+
+    def _specialty_code(self, specialty):
+        code = self.specialty_index.get(specialty)
+        if code is None:
+            code = self.specialty_index[specialty] = len(self.specialties)
+            self.specialties.append(sys.intern(specialty))
+        return code
+
+    def with_changes(self, version, rows, deleted_ids):
+        """Возвращает новый снимок с применёнными изменениями; текущий не меняется.
+
+        Колонки копируются срезами (memcpy на уровне C), а закэшированные
+        перестановки не пересортировываются: изменённые строки вынимаются из
+        них и вставляются обратно бинарным поиском.
+        """
+        snapshot = CatalogSnapshot(
+            version, self.ids[:], self.names[:], self.specialty_codes[:], self.specialties[:],
+            self.prices[:], bytearray(self.available),
+            positions=self.positions.copy(), deleted=set(self.deleted),
+        )
+        positions = snapshot.positions
+
+        touched = [positions[service_id] for service_id in deleted_ids if service_id in positions]
+        touched += [positions[row[0]] for row in rows if row[0] in positions]
+        patch_orders = len(touched) + len(rows) <= _MAX_ORDER_PATCHES
+
+        # Вынимаем изменённые строки из перестановок по старым ключам
+        if patch_orders:
+            # Копия: другие потоки могут лениво добавлять перестановки в self._orders
+            for sort_by, order in list(self._orders.items()):
+                key = self._sort_key(sort_by)
+                order = order[:]
+                for p in sorted((bisect.bisect_left(order, key(i), key=key) for i in touched),
+                                reverse=True):
+                    del order[p]
+                snapshot._orders[sort_by] = order
+
+        for service_id in deleted_ids:
+            i = positions.pop(service_id, None)
+            if i is not None:
+                snapshot.deleted.add(i)
+
+        inserted = []
+        for row in rows:
+            i = positions.get(row[0])
+            if i is None:
+                snapshot._append_row(row)
+                inserted.append(len(snapshot.ids) - 1)
+                continue
+            _, name, specialty, price, is_available = row
+            snapshot.names[i] = sys.intern(name)
+            snapshot.specialty_codes[i] = snapshot._specialty_code(specialty)
+            snapshot.prices[i] = price
+            snapshot.available[i] = _AVAILABILITY_CODES[is_available]
+            inserted.append(i)
+
+        # Возвращаем изменённые и новые строки на места по новым ключам
+        for sort_by, order in snapshot._orders.items():
+            key = snapshot._sort_key(sort_by)
+            for i in inserted:
+                bisect.insort(order, i, key=key)
+        return snapshot
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _sort_key(self, sort_by):
+        ids = self.ids
+        if sort_by == 'id':
+            return ids.__getitem__
+        if sort_by == 'service_name':
+            names = self.names
+            return lambda i: (names[i], ids[i])
+        if sort_by == 'doctor_specialty':
+            codes, specialties = self.specialty_codes, self.specialties
+            return lambda i: (specialties[codes[i]], ids[i])
+        if sort_by == 'price':
+            prices = self.prices
+            return lambda i: (prices[i], ids[i])
+        if sort_by == 'is_available':
+            # NULL идёт первым, как при ORDER BY ... ASC в SQLite
+            available = self.available
+            return lambda i: ((available[i] + 1) % 3, ids[i])
+        raise KeyError(sort_by)
+
+    def order(self, sort_by):
+        """Предварительно отсортированная перестановка индексов живых строк по полю sort_by."""
+        order = self._orders.get(sort_by)
+        if order is None:
+            order = array('I', sorted(self.positions.values(), key=self._sort_key(sort_by)))
+            self._orders[sort_by] = order
+        return order
+
+    def row(self, i):
+        return {
+            'id': self.ids[i],
+            'service_name': self.names[i],
+            'doctor_specialty': self.specialties[self.specialty_codes[i]],
+            'price': self.prices[i],
+            'is_available': _AVAILABILITY_VALUES[self.available[i]]
+        }
+
+    def list(self, sort_by='id', ids=None):
+        """Список услуг в формате MedicalService.to_dict(), опционально только с указанными ID."""
+        if ids is None:
+            return [self.row(i) for i in self.order(sort_by)]
+        positions = self.positions
+        wanted = [positions[service_id] for service_id in ids if service_id in positions]
+        wanted.sort(key=self._sort_key(sort_by))
+        return [self.row(i) for i in wanted]
+
+    def price_stats(self):
+        """(min, max, avg) по цене или (None, None, None) для пустого каталога."""
+        if self._stats is None:
+            if self.positions:
+                prices = self.prices
+                order = self.order('price')
+                total = sum(prices) - sum(prices[i] for i in self.deleted)
+                self._stats = (prices[order[0]], prices[order[-1]], total / len(self.positions))
+            else:
+                self._stats = (None, None, None)
+        return self._stats
+
+    def nbytes(self):
+        """Приблизительный объём памяти снимка в байтах."""
+        size = sum(sys.getsizeof(column) for column in
+                   (self.ids, self.names, self.specialty_codes, self.specialties,
+                    self.specialty_index, self.prices, self.available, self.positions,
+                    self.deleted))
+        size += sum(sys.getsizeof(order) for order in list(self._orders.values()))
+        # Интернированные строки учитываем один раз
+        unique = {id(s): s for s in self.names}
+        unique.update((id(s), s) for s in self.specialties)
+        size += sum(sys.getsizeof(s) for s in unique.values())
+        return size
+
+
+class CatalogReadModel:
+    """Держит актуальный CatalogSnapshot и обновляет его по версии из журнала изменений."""
+
+    def __init__(self, db, service_model, version_model, change_model, refresh_interval=0.0):
+        self._db = db
+        self._service = service_model
+        self._version = version_model
+        self._change = change_model
+        self.refresh_interval = refresh_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        """Возвращает снимок, при необходимости догрузив изменения из БД."""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+            return snapshot
+
+        # Версию читаем без блокировки: на обычном GET снимок уже актуален
+        version, pruned_version = self._read_version()
+        if not self._is_stale(snapshot, version, pruned_version):
+            self._checked_at = time.monotonic()
+            return snapshot
+
+        with self._lock:
+            # Пока ждали блокировку, снимок мог обновить другой поток
+            snapshot = self._snapshot
+            if self._is_stale(snapshot, version, pruned_version):
+                version, pruned_version = self._read_version()
+                # Журнал до pruned_version уже удалён - догрузить изменения нельзя
+                if snapshot is None or version < snapshot.version or snapshot.version < pruned_version:
+                    snapshot = self._load_all(version)
+                elif version > snapshot.version:
+                    snapshot = self._load_changes(snapshot, version)
+                self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+        return snapshot
+
+    def _read_version(self):
+        return self._db.session.execute(
+            select(self._version.version, self._version.pruned_version)
+            .where(self._version.id == CATALOG_VERSION_ID)
+        ).one()
+
+    @staticmethod
+    def _is_stale(snapshot, version, pruned_version):
+        return snapshot is None or version != snapshot.version or snapshot.version < pruned_version
+
+    def _columns(self):
+        service = self._service
+        return select(service.id, service.service_name, service.doctor_specialty,
+                      service.price, service.is_available)
+
+    def _load_all(self, version):
+        # Версию читаем до строк: изменения, попавшие между запросами,
+        # просто применятся ещё раз при следующем обновлении
+        rows = self._db.session.execute(self._columns().order_by(self._service.id))
+        return CatalogSnapshot.from_rows(version, rows)
+
+    def _load_changes(self, snapshot, version):
+        change = self._change
+        changed_ids = set(self._db.session.execute(
+            select(change.service_id).where(change.version > snapshot.version, change.version <= version)
+        ).scalars())
+
+        # При массовых изменениях или накоплении удалённых строк дешевле перечитать таблицу целиком
+        if len(changed_ids) > len(snapshot) // 2 or len(snapshot.deleted) > len(snapshot.ids) // 4:
+            return self._load_all(version)
+
+        rows = []
+        pending = list(changed_ids)
+        for start in range(0, len(pending), _IN_CHUNK_SIZE):
+            chunk = pending[start:start + _IN_CHUNK_SIZE]
+            rows.extend(self._db.session.execute(
+                self._columns().where(self._service.id.in_(chunk))
+            ))
+        deleted_ids = changed_ids.difference(row[0] for row in rows)
+        return snapshot.with_changes(version, rows, deleted_ids)
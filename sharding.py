@@ -0,0 +1,216 @@
+# sharding.py
+# Шардирование medical_service по нескольким БД (binds Flask-SQLAlchemy).
+#
+# Глобальный ID услуги: id = k * N + shard, где k берётся из таблицы-счётчика
+# shard_id_sequence своего шарда, а N - число шардов. Поэтому шард любой
+# услуги вычисляется как id % N, а ID уникальны во всех шардах. Число шардов
+# после создания данных менять нельзя.
+#
+# Новая услуга попадает в шард по crc32(doctor_specialty) (SHARD_KEY=doctor_specialty)
+# или по кругу (SHARD_KEY=id). Шард назначается при создании и не меняется,
+# даже если позже изменить специальность.
+#
+# Схема шардов (medical_service и shard_id_sequence) создаётся при старте,
+# как и db.create_all() для основной БД. Услуги, созданные до включения
+# шардирования, переносятся командой flask shards backfill (ShardRouter.backfill):
+# каждая попадает в шард id % N со своим ID, а счётчик шарда сдвигается за неё.
+import heapq
+import itertools
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import g
+from sqlalchemy import Column, Integer, MetaData, String, Table, delete, func, insert, select, text
+from sqlalchemy.orm import Session
+
+from read_model import SORT_FIELDS
+
+SHARD_KEYS = ('doctor_specialty', 'id')
+
+# Побайтовые collation, при которых порядок строк в БД совпадает с порядком
+# str в Python (по кодовым точкам) - иначе heapq.merge сольёт шарды неверно
+BINARY_COLLATIONS = {
+    'sqlite': 'BINARY',
+    'postgresql': 'C',
+}
+
+_id_sequence = Table(
+    'shard_id_sequence', MetaData(),
+    Column('id', Integer, primary_key=True),
+)
+
+
+def _merge_key(sort_by):
+    # NULL идёт первым (в запросах шардов - NULLS FIRST); id - для стабильного порядка
+    return lambda service: (service[sort_by] is not None, service[sort_by], service['id'])
+
+
+class ShardRouter:
+    """Маршрутизирует запросы к шардам и собирает результаты чтения со всех шардов."""
+
+    def __init__(self, engines, service_model, key='doctor_specialty'):
+        if key not in SHARD_KEYS:
+            raise ValueError(f'Неизвестный ключ шардирования: {key}')
+        self.engines = list(engines)
+        for engine in self.engines:
+            if engine.dialect.name not in BINARY_COLLATIONS:
+                raise ValueError(f'Шардирование не поддерживает СУБД {engine.dialect.name}')
+        self.key = key
+        self._service = service_model
+        self._round_robin = itertools.count()
+        self._round_robin_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=len(self.engines),
+                                            thread_name_prefix='shard')
+
+        for engine in self.engines:
+            service_model.__table__.create(engine, checkfirst=True)
+            _id_sequence.create(engine, checkfirst=True)
+
+    def __len__(self):
+        return len(self.engines)
+
+    # --- Маршрутизация записей ---
+
+    def shard_for_id(self, service_id):
+        return service_id % len(self.engines)
+
+    def shard_for_new(self, service):
+        if self.key == 'doctor_specialty':
+            return zlib.crc32(service.doctor_specialty.encode('utf-8')) % len(self.engines)
+        with self._round_robin_lock:
+            return next(self._round_robin) % len(self.engines)
+
+    def session(self, shard):
+        """Сессия шарда для текущего запроса (закрывается в remove())."""
+        sessions = g.setdefault('shard_sessions', {})
+        if shard not in sessions:
+            sessions[shard] = Session(self.engines[shard])
+        return sessions[shard]
+
+    def session_for_id(self, service_id):
+        return self.session(self.shard_for_id(service_id))
+
+    def add(self, service):
+        """Добавляет новую услугу в её шард, назначает глобальный ID и возвращает сессию шарда."""
+        shard = self.shard_for_new(service)
+        session = self.session(shard)
+        sequence = session.execute(insert(_id_sequence)).inserted_primary_key[0]
+        service.id = sequence * len(self.engines) + shard
+        session.add(service)
+        session.flush()
+        return session
+
+    def backfill(self, source_session, batch_size=1000):
+        """Переносит услуги из несшардированной таблицы source_session в шарды с сохранением ID.
+
+        Повторный запуск после сбоя безопасен: строки, уже перенесённые в шард,
+        пропускаются. Возвращает число перенесённых услуг.
+        """
+        table = self._service.__table__
+        moved = 0
+        while True:
+            rows = source_session.execute(
+                select(table).order_by(table.c.id).limit(batch_size)
+            ).mappings().all()
+            if not rows:
+                return moved
+
+            for shard, shard_ids in self.group_ids([row['id'] for row in rows]).items():
+                shard_rows = [dict(row) for row in rows if row['id'] in shard_ids]
+                with Session(self.engines[shard]) as session:
+                    existing = {
+                        row['id']: dict(row) for row in session.execute(
+                            select(table).where(table.c.id.in_(shard_ids))
+                        ).mappings()
+                    }
+                    for row in shard_rows:
+                        if row['id'] in existing and existing[row['id']] != row:
+                            raise RuntimeError(f'ID {row["id"]} в шарде {shard} уже занят другой услугой')
+                    new_rows = [row for row in shard_rows if row['id'] not in existing]
+                    if new_rows:
+                        session.execute(insert(table), new_rows)
+                    self._advance_sequence(session, max(shard_ids))
+                    session.commit()
+
+            source_session.execute(delete(table).where(table.c.id.in_([row['id'] for row in rows])))
+            source_session.commit()
+            moved += len(rows)
+
+    def _advance_sequence(self, session, service_id):
+        # Следующий ID шарда должен быть больше перенесённого: id = k * N + shard
+        sequence = service_id // len(self.engines)
+        current = session.execute(select(func.max(_id_sequence.c.id))).scalar() or 0
+        if sequence <= current:
+            return
+        session.execute(insert(_id_sequence).values(id=sequence))
+        if session.bind.dialect.name == 'postgresql':
+            session.execute(text("SELECT setval(pg_get_serial_sequence('shard_id_sequence', 'id'), :value)"),
+                            {'value': sequence})
+
+    def group_ids(self, ids):
+        """{шард: [ID]} для списка ID."""
+        groups = {}
+        for service_id in ids:
+            groups.setdefault(self.shard_for_id(service_id), []).append(service_id)
+        return groups
+
+    def commit(self):
+        for session in g.get('shard_sessions', {}).values():
+            session.commit()
+
+    def rollback(self):
+        for session in g.get('shard_sessions', {}).values():
+            session.rollback()
+
+    def remove(self):
+        for session in g.pop('shard_sessions', {}).values():
+            session.close()
+
+    # --- Scatter-gather чтение ---
+
+    def _scatter(self, fn, shards=None):
+        """Параллельно вызывает fn(session, shard) для шардов и возвращает результаты по порядку."""
+        def run(shard):
+            with Session(self.engines[shard]) as session:
+                return fn(session, shard)
+
+        shards = range(len(self.engines)) if shards is None else list(shards)
+        return list(self._executor.map(run, shards))
+
+    def list_services(self, sort_by='id', ids=None):
+        """Услуги со всех шардов, слитые k-way merge по sort_by."""
+        service = self._service
+        if sort_by not in SORT_FIELDS:
+            raise KeyError(sort_by)
+        column = getattr(service, sort_by)
+        groups = self.group_ids(ids) if ids is not None else None
+
+        def fetch(session, shard):
+            sort_column = column
+            if isinstance(column.type, String):
+                sort_column = column.collate(BINARY_COLLATIONS[self.engines[shard].dialect.name])
+            query = select(service).order_by(sort_column.asc().nulls_first(), service.id.asc())
+            if groups is not None:
+                query = query.where(service.id.in_(groups[shard]))
+            return [row.to_dict() for row in session.scalars(query)]
+
+        partials = self._scatter(fetch, groups)
+        return list(heapq.merge(*partials, key=_merge_key(sort_by)))
+
+    def stats(self, field):
+        """(min, max, avg) по числовому полю из частичных count/sum/min/max шардов."""
+        column = getattr(self._service, field)
+
+        def fetch(session, shard):
+            return session.execute(select(
+                func.count(column), func.sum(column), func.min(column), func.max(column)
+            )).one()
+
+        partials = [p for p in self._scatter(fetch) if p[0]]
+        if not partials:
+            return None, None, None
+        count = sum(p[0] for p in partials)
+        return (min(p[2] for p in partials),
+                max(p[3] for p in partials),
+                sum(p[1] for p in partials) / count)